@@ -0,0 +1,396 @@
+"""
+Alocação automática de salas para demandas de cursos.
+
+Uma demanda descreve uma turma (dias da semana, horário, período, número de
+alunos, necessidade de computadores/softwares e localização preferida). O
+solver carrega salas e ocupação existente em duas consultas, monta um índice
+de ocupação por (sala, dia da semana) e resolve em memória:
+
+1. as demandas mais restritas (menos salas compatíveis) são alocadas primeiro,
+   cada uma na sala livre de menor custo (lugares sobrando + penalidade de
+   localização);
+2. quando nenhuma sala compatível está livre, tenta-se um caminho de aumento
+   (como no emparelhamento bipartido de Kuhn): a demanda ocupa a sala de uma
+   demanda já planejada, que é realocada recursivamente para outra sala.
+
+Horários já gravados em Schedule nunca são movidos.
+"""
+import json
+import time as time_module
+from datetime import date, datetime, time
+
+from sqlalchemy import or_
+
+from app import db
+from models import Room, Schedule
+
+LOCATION_PENALTY = 50  # custo (em lugares ociosos) de não atender a localização preferida
+MAX_REPAIR_DEPTH = 4
+
+# Text fields of a demand -> Schedule column length
+TEXT_FIELDS = {
+    'subject_name': Schedule.subject_name.type.length,
+    'professor_name': Schedule.professor_name.type.length,
+    'technical_course': Schedule.technical_course.type.length,
+    'preferred_location': None,  # only compared, never stored
+}
+
+
+class AllocationError(Exception):
+    pass
+
+
+def _parse_time(value, field):
+    if isinstance(value, time):
+        return value
+    try:
+        return datetime.strptime(value, '%H:%M').time()
+    except (TypeError, ValueError):
+        raise AllocationError(f'{field}: horário inválido, use HH:MM.')
+
+
+def _parse_date(value, field):
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise AllocationError(f'{field}: data inválida, use AAAA-MM-DD.')
+
+
+def _parse_software(value):
+    if not value:
+        return set()
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = value.split('\n')
+    return {item.strip().casefold() for item in value if item and item.strip()}
+
+
+def _dates_overlap(start_a, end_a, start_b, end_b):
+    # None means an open-ended period
+    return (end_a is None or start_b is None or start_b <= end_a) and \
+           (end_b is None or start_a is None or start_a <= end_b)
+
+
+class Demand:
+    def __init__(self, key, subject_name, professor_name, weekdays, start_time, end_time,
+                 start_date=None, end_date=None, headcount=1, needs_computers=False,
+                 software=None, preferred_location=None, technical_course=None):
+        self.key = key
+        self.subject_name = subject_name
+        self.professor_name = professor_name
+        self.weekdays = sorted(set(weekdays))
+        self.start_time = start_time
+        self.end_time = end_time
+        self.start_date = start_date
+        self.end_date = end_date
+        self.headcount = headcount
+        self.needs_computers = needs_computers
+        self.software = set(software or ())
+        self.preferred_location = preferred_location
+        self.technical_course = technical_course
+
+    def __repr__(self):
+        return f'<Demand {self.key}>'
+
+    @classmethod
+    def from_dict(cls, data, index):
+        if not isinstance(data, dict):
+            raise AllocationError(f'demanda-{index + 1}: cada demanda deve ser um objeto.')
+        key = str(data.get('id') or f'demanda-{index + 1}')
+        for field, max_length in TEXT_FIELDS.items():
+            value = data.get(field)
+            if value is not None and not isinstance(value, str):
+                raise AllocationError(f'{key}: {field} deve ser um texto.')
+            if value and max_length and len(value) > max_length:
+                raise AllocationError(f'{key}: {field} deve ter no máximo {max_length} caracteres.')
+        if not data.get('subject_name') or not data.get('professor_name'):
+            raise AllocationError(f'{key}: informe subject_name e professor_name.')
+
+        weekdays = data.get('weekdays') or []
+        if not weekdays or any(not isinstance(day, int) or not 0 <= day <= 6 for day in weekdays):
+            raise AllocationError(f'{key}: weekdays deve ser uma lista de 0 (segunda) a 6 (domingo).')
+
+        start_time = _parse_time(data.get('start_time'), f'{key}.start_time')
+        end_time = _parse_time(data.get('end_time'), f'{key}.end_time')
+        if end_time <= start_time:
+            raise AllocationError(f'{key}: o horário de término deve ser posterior ao de início.')
+
+        start_date = _parse_date(data.get('start_date'), f'{key}.start_date')
+        end_date = _parse_date(data.get('end_date'), f'{key}.end_date')
+        if start_date and end_date and end_date < start_date:
+            raise AllocationError(f'{key}: a data de fim deve ser posterior à data de início.')
+
+        try:
+            headcount = int(data['headcount']) if data.get('headcount') is not None else 1
+        except (TypeError, ValueError):
+            headcount = 0
+        if headcount < 1:
+            raise AllocationError(f'{key}: headcount deve ser um número inteiro maior que zero.')
+
+        return cls(
+            key=key,
+            subject_name=data['subject_name'],
+            professor_name=data['professor_name'],
+            weekdays=weekdays,
+            start_time=start_time,
+            end_time=end_time,
+            start_date=start_date,
+            end_date=end_date,
+            headcount=headcount,
+            needs_computers=bool(data.get('needs_computers')),
+            software=_parse_software(data.get('software')),
+            preferred_location=data.get('preferred_location'),
+            technical_course=data.get('technical_course'),
+        )
+
+    def conflicts_with(self, day_of_week, start_time, end_time, start_date, end_date):
+        return day_of_week in self.weekdays and \
+            start_time < self.end_time and end_time > self.start_time and \
+            _dates_overlap(self.start_date, self.end_date, start_date, end_date)
+
+
+class _Room:
+    def __init__(self, row):
+        self.id = row.id
+        self.name = row.name
+        self.location = row.location or ''
+        self.capacity = row.capacity
+        self.has_computers = bool(row.has_computers)
+        self.software = _parse_software(row.software_list)
+
+    def fits(self, demand):
+        return self.capacity >= demand.headcount and \
+            (self.has_computers or not demand.needs_computers) and \
+            demand.software <= self.software
+
+    def location_match(self, demand):
+        return not demand.preferred_location or \
+            demand.preferred_location.casefold() in self.location.casefold()
+
+    def cost(self, demand):
+        return self.capacity - demand.headcount + (0 if self.location_match(demand) else LOCATION_PENALTY)
+
+
+class Plan:
+    def __init__(self):
+        self.assignments = {}  # demand key -> (demand, room)
+        self.unassigned = []   # (demand, reason)
+        self.seconds = 0.0
+
+    @property
+    def total_waste(self):
+        return sum(room.capacity - demand.headcount for demand, room in self.assignments.values())
+
+    def to_dict(self):
+        return {
+            'assignments': [
+                {
+                    'demand': demand.key,
+                    'room_id': room.id,
+                    'room_name': room.name,
+                    'capacity': room.capacity,
+                    'headcount': demand.headcount,
+                    'wasted_seats': room.capacity - demand.headcount,
+                    'location_match': room.location_match(demand),
+                }
+                for demand, room in self.assignments.values()
+            ],
+            'unassigned': [{'demand': demand.key, 'reason': reason} for demand, reason in self.unassigned],
+            'total_wasted_seats': self.total_waste,
+            'seconds': round(self.seconds, 4),
+        }
+
+
+class _Occupancy:
+    """Bookings per (room, weekday); owner is None for existing schedules"""
+
+    def __init__(self):
+        self._bookings = {}
+
+    def add_schedule(self, row):
+        self._bookings.setdefault((row.room_id, row.day_of_week), []).append(
+            (row.start_time, row.end_time, row.start_date, row.end_date, None)
+        )
+
+    def place(self, demand, room):
+        for day in demand.weekdays:
+            self._bookings.setdefault((room.id, day), []).append(
+                (demand.start_time, demand.end_time, demand.start_date, demand.end_date, demand)
+            )
+
+    def remove(self, demand, room):
+        for day in demand.weekdays:
+            bookings = self._bookings[(room.id, day)]
+            bookings[:] = [booking for booking in bookings if booking[4] is not demand]
+
+    def blockers(self, demand, room):
+        """Planned demands that clash with `demand` in `room`, or None if an
+        existing schedule clashes (those cannot be moved)"""
+        found = []
+        for day in demand.weekdays:
+            for start_time, end_time, start_date, end_date, owner in self._bookings.get((room.id, day), ()):
+                if demand.conflicts_with(day, start_time, end_time, start_date, end_date):
+                    if owner is None:
+                        return None
+                    if owner not in found:
+                        found.append(owner)
+        return found
+
+
+def _lock_rooms(room_ids=None):
+    """Serialize concurrent allocations touching the same rooms (no-op on
+    SQLite, where write transactions are serialized anyway). Runs before the
+    occupancy is read: a concurrent commit either finished before the lock,
+    and its schedules are seen, or waits for this transaction"""
+    query = db.select(Room.id).order_by(Room.id).with_for_update()
+    if room_ids is not None:
+        query = query.where(Room.id.in_(sorted(room_ids)))
+    db.session.execute(query).all()
+
+
+def _load(demands):
+    rooms = [_Room(row) for row in db.session.execute(
+        db.select(Room.id, Room.name, Room.location, Room.capacity, Room.has_computers, Room.software_list)
+    )]
+
+    weekdays = sorted({day for demand in demands for day in demand.weekdays})
+    query = db.select(
+        Schedule.room_id, Schedule.day_of_week, Schedule.start_time, Schedule.end_time,
+        Schedule.start_date, Schedule.end_date
+    ).where(Schedule.day_of_week.in_(weekdays))
+
+    # Only schedules that can overlap the planning period matter
+    if all(demand.start_date for demand in demands):
+        first_day = min(demand.start_date for demand in demands)
+        query = query.where(or_(Schedule.end_date.is_(None), Schedule.end_date >= first_day))
+    if all(demand.end_date for demand in demands):
+        last_day = max(demand.end_date for demand in demands)
+        query = query.where(or_(Schedule.start_date.is_(None), Schedule.start_date <= last_day))
+
+    occupancy = _Occupancy()
+    for row in db.session.execute(query):
+        occupancy.add_schedule(row)
+    return rooms, occupancy
+
+
+def parse_demands(items):
+    if not isinstance(items, list) or not items:
+        raise AllocationError('Informe uma lista de demandas.')
+    demands = [Demand.from_dict(item, index) for index, item in enumerate(items)]
+    keys = [demand.key for demand in demands]
+    if len(set(keys)) != len(keys):
+        raise AllocationError('Os identificadores das demandas devem ser únicos.')
+    return demands
+
+
+def solve(demands, lock=False):
+    """Propose a room for every demand; returns a Plan (nothing is written).
+
+    With `lock`, every room is locked before the occupancy is read, for a
+    plan that commit() writes in the same transaction"""
+    started = time_module.perf_counter()
+    if lock:
+        _lock_rooms()
+    rooms, occupancy = _load(demands)
+    plan = Plan()
+
+    candidates = {}
+    for demand in demands:
+        fitting = [room for room in rooms if room.fits(demand)]
+        fitting.sort(key=lambda room: (room.cost(demand), room.name))
+        candidates[demand.key] = fitting
+
+    def assign(demand, room):
+        occupancy.place(demand, room)
+        plan.assignments[demand.key] = (demand, room)
+
+    def unassign(demand):
+        _, room = plan.assignments.pop(demand.key)
+        occupancy.remove(demand, room)
+        return room
+
+    def augment(demand, depth, visited):
+        for room in candidates[demand.key]:
+            if room.id in visited:
+                continue
+            blockers = occupancy.blockers(demand, room)
+            if blockers is None:
+                continue
+            if not blockers:
+                assign(demand, room)
+                return True
+            if depth == 0 or len(blockers) > 1:
+                continue
+            visited.add(room.id)
+            blocker = blockers[0]
+            unassign(blocker)
+            assign(demand, room)
+            if augment(blocker, depth - 1, visited):
+                return True
+            unassign(demand)
+            assign(blocker, room)
+        return False
+
+    # Most constrained demands first, then the ones occupying more slots
+    order = sorted(demands, key=lambda d: (len(candidates[d.key]), -d.headcount, -len(d.weekdays)))
+    for demand in order:
+        if not candidates[demand.key]:
+            plan.unassigned.append((demand, 'Nenhuma sala atende capacidade, computadores e softwares exigidos.'))
+        elif not augment(demand, MAX_REPAIR_DEPTH, set()):
+            plan.unassigned.append((demand, 'Todas as salas compatíveis estão ocupadas nesse horário.'))
+
+    plan.seconds = time_module.perf_counter() - started
+    return plan
+
+
+def check(demands, room_ids):
+    """Rebuild a previewed plan ({demand key: room id}) against the current
+    occupancy; raises AllocationError if it is no longer valid.
+
+    The rooms are locked first, so commit() must follow in the same transaction"""
+    _lock_rooms({room_id for room_id in room_ids.values() if isinstance(room_id, int)})
+    rooms, occupancy = _load(demands)
+    rooms_by_id = {room.id: room for room in rooms}
+    plan = Plan()
+    for demand in demands:
+        room = rooms_by_id.get(room_ids.get(demand.key))
+        if room is None:
+            raise AllocationError(f'{demand.key}: sala não informada ou inexistente.')
+        if not room.fits(demand):
+            raise AllocationError(f'{demand.key}: a sala {room.name} não atende a demanda.')
+        if occupancy.blockers(demand, room) != []:
+            raise AllocationError(f'{demand.key}: a sala {room.name} não está mais livre nesse horário.')
+        occupancy.place(demand, room)
+        plan.assignments[demand.key] = (demand, room)
+    return plan
+
+
+def commit(plan):
+    """Write every assignment of the plan as recurring schedules in one
+    transaction; the plan must come from check() or solve(lock=True)"""
+    created = 0
+    try:
+        for demand, room in plan.assignments.values():
+            for day in demand.weekdays:
+                db.session.add(Schedule(
+                    room_id=room.id,
+                    day_of_week=day,
+                    subject_name=demand.subject_name,
+                    professor_name=demand.professor_name,
+                    start_time=demand.start_time,
+                    end_time=demand.end_time,
+                    start_date=demand.start_date,
+                    end_date=demand.end_date,
+                    technical_course=demand.technical_course,
+                    is_recurring=True
+                ))
+                created += 1
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return created
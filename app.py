@@ -4,41 +4,53 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+import database
+import instrumentation
+from config import profiles
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': database.RoutingSession})
+
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+def create_app(profile=None, config=None):
+    """
+    Application factory. Nothing here touches the database, so the app can be
+    preloaded by pre-fork servers (gunicorn --preload); the schema is created
+    with `flask --app main init-db`.
+    """
+    profile = profile or os.environ.get('APP_PROFILE', 'dev')
+    if profile not in profiles:
+        raise ValueError(f'Perfil de configuração desconhecido: {profile}')
 
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///classroom_manager.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+    app = Flask(__name__)
+    app.config.from_object(profiles[profile])
+    app.config['PROFILE'] = profile
+    if config:
+        app.config.update(config)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-# Configure upload folder
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Configure logging
+    logging.basicConfig(level=app.config['LOG_LEVEL'])
 
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Ensure upload directory exists
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Initialize the app with the extension
-db.init_app(app)
+    # Initialize the app with the extensions
+    database.configure(app)
+    db.init_app(app)
+    database.init_engines(app, db)
+    instrumentation.init_app(app)
 
-with app.app_context():
-    # Import models to ensure tables are created
+    # Import models so SQLAlchemy knows every table, then routes and CLI commands
     import models
-    db.create_all()
+    import live
+    live.broker.init_app(app)
+    from routes import bp
+    app.register_blueprint(bp)
+
+    import commands
+    commands.init_app(app)
 
-# Import routes
-import routes
+    return app
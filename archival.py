@@ -0,0 +1,41 @@
+"""
+Arquivamento de horários expirados: move em lotes os horários cujo período
+terminou para a tabela schedule_archive, mantendo a tabela principal com o
+tamanho do período letivo atual. Executado por `flask archive-schedules`
+(agendar diariamente, por exemplo via cron ou Scheduled Deployment).
+"""
+from datetime import datetime
+
+from sqlalchemy import literal
+
+from app import db
+from models import Schedule, ScheduleArchive
+
+
+def archive_expired(cutoff, batch_size=500):
+    """Move schedules that ended before `cutoff`; each batch is its own transaction"""
+    schedule = Schedule.__table__
+    names = [column.name for column in schedule.columns if column.name != 'id']
+    moved = 0
+
+    while True:
+        ids = db.session.execute(
+            db.select(Schedule.id).where(Schedule.end_date < cutoff).order_by(Schedule.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+
+        # The archive has its own primary key; the original id goes to schedule_id
+        rows = db.select(
+            schedule.c.id,
+            *[schedule.c[name] for name in names],
+            literal(datetime.utcnow(), type_=db.DateTime).label('archived_at')
+        ).where(schedule.c.id.in_(ids))
+        db.session.execute(ScheduleArchive.__table__.insert().from_select(
+            ['schedule_id'] + names + ['archived_at'], rows
+        ))
+        db.session.execute(schedule.delete().where(schedule.c.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+
+    return moved
@@ -0,0 +1,157 @@
+"""
+Teste de carga concorrente: leituras e escritas misturadas por perfil de engine.
+
+Cada perfil roda em um processo novo, com um banco próprio (SQLite temporário
+ou o DATABASE_URL informado), e N threads disparam requisições pelo cliente de
+teste do Flask: GET da página da sala e da busca de salas, e POST de novos
+horários. São informadas a vazão (req/s) por tipo, a latência p95 e os erros
+(5xx, como "database is locked").
+
+    python benchmarks/load.py --profiles basic sqlite-wal --threads 16 --seconds 10
+    python benchmarks/load.py --profiles basic postgres-pooled --database-url postgresql://...
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOMS = 50
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_profile(args):
+    """Runs inside the child process: one profile, one database"""
+    sys.path.insert(0, ROOT)
+    from app import create_app, db
+    from models import Room
+
+    app = create_app('prod', config={
+        'SQLALCHEMY_DATABASE_URI': args.database_url,
+        'DB_ENGINE_PROFILE': args.profile,
+        'WTF_CSRF_ENABLED': False,
+    })
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all(Room(name=f'Sala {number:03d}', capacity=30, location=f'Bloco {number % 4}')
+                           for number in range(ROOMS))
+        db.session.commit()
+        room_ids = list(db.session.scalars(db.select(Room.id)))
+
+    stats = {'read': [], 'write': [], 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        local = {'read': [], 'write': [], 'errors': 0}
+        while time.perf_counter() < deadline:
+            if rng.random() < args.write_ratio:
+                kind = 'write'
+                hour, minute = rng.randrange(7, 22), rng.choice((0, 15, 30, 45))
+                request = lambda: client.post('/schedule/new', data={
+                    'room_id': rng.choice(room_ids),
+                    'day_of_week': rng.randrange(1, 7),
+                    'subject_name': 'Carga',
+                    'professor_name': 'Benchmark',
+                    'start_time': f'{hour:02d}:{minute:02d}',
+                    'end_time': f'{hour:02d}:{minute + 10:02d}',
+                    'is_recurring': 'y',
+                })
+            else:
+                kind = 'read'
+                if rng.random() < 0.5:
+                    request = lambda: client.get(f'/room/{rng.choice(room_ids)}')
+                else:
+                    request = lambda: client.get('/api/rooms/search?q=Sala%200')
+            start = time.perf_counter()
+            try:
+                response = request()
+                failed = response.status_code >= 500
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+            if failed:
+                local['errors'] += 1
+            else:
+                local[kind].append(elapsed)
+        with lock:
+            stats['read'] += local['read']
+            stats['write'] += local['write']
+            stats['errors'] += local['errors']
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        active = app.config['DB_ENGINE_PROFILE_ACTIVE']
+        db.session.remove()
+        db.drop_all()
+
+    print(json.dumps({
+        'profile': active,
+        'reads_per_second': len(stats['read']) / args.seconds,
+        'writes_per_second': len(stats['write']) / args.seconds,
+        'read_p95_ms': _percentile(stats['read'], 0.95) * 1000,
+        'write_p95_ms': _percentile(stats['write'], 0.95) * 1000,
+        'errors': stats['errors'],
+    }))
+
+
+def spawn(profile, args):
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = args.database_url or f'sqlite:///{os.path.join(workdir, "load.db")}'
+        command = [
+            sys.executable, os.path.abspath(__file__), '--child',
+            '--profiles', profile, '--database-url', database_url,
+            '--threads', str(args.threads), '--seconds', str(args.seconds),
+            '--write-ratio', str(args.write_ratio),
+        ]
+        # Uploads go to the temporary directory as well
+        result = subprocess.run(command, cwd=workdir, capture_output=True, text=True)
+        if result.returncode:
+            sys.exit(result.stderr)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=['basic', 'sqlite-wal'])
+    parser.add_argument('--database-url', help='Banco usado pelo teste (as tabelas são recriadas!)')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.profile = args.profiles[0]
+        run_profile(args)
+        return
+
+    print(f'threads={args.threads} seconds={args.seconds} write_ratio={args.write_ratio}')
+    for profile in args.profiles:
+        result = spawn(profile, args)
+        print(f'{result["profile"]:>16}: {result["reads_per_second"]:7.1f} leituras/s '
+              f'(p95 {result["read_p95_ms"]:6.1f} ms), {result["writes_per_second"]:6.1f} escritas/s '
+              f'(p95 {result["write_p95_ms"]:6.1f} ms), {result["errors"]} erros')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Mede o tempo de inicialização da aplicação (boot de um worker / cold start).
+
+Cada execução roda em um processo Python novo, importando `main` (que chama
+create_app) e informa se as bibliotecas pesadas de relatório foram carregadas.
+
+    python benchmarks/startup.py --runs 10 --profile prod
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+heavy = sorted(name for name in ('reportlab', 'qrcode', 'PIL') if name in sys.modules)
+print(json.dumps({'seconds': elapsed, 'heavy_modules': heavy}))
+"""
+
+
+def run_once(profile):
+    env = dict(os.environ, APP_PROFILE=profile)
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--profile', default='prod')
+    args = parser.parse_args()
+
+    samples = [run_once(args.profile) for _ in range(args.runs)]
+    times = [sample['seconds'] * 1000 for sample in samples]
+    print(f'profile={args.profile} runs={args.runs}')
+    print(f'import main: median {statistics.median(times):.1f} ms, '
+          f'min {min(times):.1f} ms, max {max(times):.1f} ms')
+    print(f'heavy modules loaded at startup: {", ".join(samples[-1]["heavy_modules"]) or "none"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import json
+from datetime import date, timedelta
+import click
+from app import db
+import allocation
+import archival
+import export
+
+
+def init_app(app):
+    """Register the maintenance commands on `flask --app main ...`"""
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Create the missing tables (existing tables are left untouched)."""
+        db.create_all()
+        # create_all only creates indexes together with new tables
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        click.echo('Tabelas criadas.')
+
+    @app.cli.command('allocate')
+    @click.argument('demands_file', type=click.File('r'))
+    @click.option('--commit', 'do_commit', is_flag=True, help='Grava a alocação proposta (tudo ou nada).')
+    def allocate(demands_file, do_commit):
+        """Propose rooms for the course demands in DEMANDS_FILE (JSON list)."""
+        try:
+            demands = allocation.parse_demands(json.load(demands_file))
+        except (ValueError, allocation.AllocationError) as error:
+            raise click.ClickException(str(error))
+
+        plan = allocation.solve(demands, lock=do_commit)
+        for demand, room in plan.assignments.values():
+            click.echo(f'{demand.key}: {room.name} ({demand.headcount}/{room.capacity} lugares)')
+        for demand, reason in plan.unassigned:
+            click.echo(f'{demand.key}: NÃO ALOCADA - {reason}')
+        click.echo(f'{len(plan.assignments)} alocadas, {len(plan.unassigned)} sem sala, '
+                   f'{plan.total_waste} lugares ociosos, {plan.seconds:.2f}s')
+
+        if do_commit:
+            if plan.unassigned:
+                raise click.ClickException('Há demandas sem sala; nada foi gravado.')
+            created = allocation.commit(plan)
+            click.echo(f'{created} horários criados.')
+
+    @app.cli.command('export')
+    @click.argument('entity', type=click.Choice(sorted(export.ENTITIES) + ['archive']))
+    @click.option('--format', 'fmt', type=click.Choice(sorted(export.FORMATS)), default='csv')
+    @click.option('--blobs', is_flag=True, help='Inclui imagens e arquivos binários (apenas para "archive").')
+    @click.option('--with-passwords', is_flag=True, help='Inclui as senhas dos computadores das salas.')
+    @click.option('--output', '-o', type=click.File('wb'), default='-')
+    def export_command(entity, fmt, blobs, with_passwords, output):
+        """Stream a table (or the full archive) to OUTPUT."""
+        try:
+            if entity == 'archive':
+                chunks = export.export_archive(fmt, blobs, app.config['UPLOAD_FOLDER'], with_passwords)
+            else:
+                chunks = export.export_entity(entity, fmt, with_passwords)
+        except export.ExportError as error:
+            raise click.ClickException(str(error))
+        for chunk in chunks:
+            output.write(chunk)
+
+    @app.cli.command('archive-schedules')
+    @click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Arquiva horários encerrados antes desta data (padrão: hoje - ARCHIVE_AFTER_DAYS).')
+    @click.option('--batch-size', type=int, default=500, show_default=True)
+    def archive_schedules(before, batch_size):
+        """Move expired schedules to the schedule_archive table."""
+        cutoff = before.date() if before else date.today() - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])
+        moved = archival.archive_expired(cutoff, batch_size=batch_size)
+        click.echo(f'{moved} horários encerrados antes de {cutoff:%d/%m/%Y} arquivados.')
@@ -0,0 +1,61 @@
+import os
+
+
+class Config:
+    SECRET_KEY = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+
+    # Database
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///classroom_manager.db")
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+
+    # Engine profile: auto, basic, sqlite-wal or postgres-pooled (see database.py)
+    DB_ENGINE_PROFILE = os.environ.get('DB_ENGINE_PROFILE', 'auto')
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '10'))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_READ_POOL = os.environ.get('SQLITE_READ_POOL', '1') == '1'
+    PG_STATEMENT_TIMEOUT_MS = int(os.environ.get('PG_STATEMENT_TIMEOUT_MS', '15000'))
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    DB_READ_AFTER_WRITE_SECONDS = 10  # reads stay on the primary after a write (replica lag)
+
+    # Schedules: pages show the active window; expired rows are archived
+    SCHEDULE_WINDOW_DAYS = 180
+    ARCHIVE_AFTER_DAYS = 30
+
+    # Uploads
+    UPLOAD_FOLDER = 'uploads'
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', '4'))
+    MAX_IMAGE_PIXELS = 40_000_000  # largura x altura
+
+    # Door displays (see live.py): open SSE streams per worker; with threaded
+    # workers keep it below gunicorn --threads (the gevent deployment raises it)
+    LIVE_MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS', '50'))
+
+    # Instrumentation (off by default; see instrumentation.py)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', '200'))
+
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')
+
+
+class ProductionConfig(Config):
+    DEBUG = False
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING')
+
+
+# Selected with APP_PROFILE (or create_app(profile=...))
+profiles = {
+    'dev': DevelopmentConfig,
+    'prod': ProductionConfig,
+}
@@ -0,0 +1,181 @@
+"""
+Perfis de engine do banco de dados (DB_ENGINE_PROFILE).
+
+- basic: comportamento anterior (pool_recycle + pool_pre_ping).
+- sqlite-wal: WAL, synchronous=NORMAL, busy_timeout e mmap; escritas em
+  requisições não-GET usam BEGIN IMMEDIATE (evita o "database is locked" ao
+  promover uma leitura a escrita) e um pool separado, somente leitura
+  (query_only), atende os SELECTs das rotas GET.
+- postgres-pooled: pool dimensionado, sem ping a cada checkout, statement
+  timeout e, com DATABASE_REPLICA_URL, leituras das rotas GET na réplica.
+- auto (padrão): sqlite-wal para SQLite, postgres-pooled para Postgres.
+
+As leituras vão para o bind "reader" pelo RoutingSession; flushes, INSERT,
+UPDATE, DELETE e SELECT ... FOR UPDATE sempre usam o banco principal, assim
+como consultas executadas com `bind_arguments=PRIMARY` (caches) e, por
+DB_READ_AFTER_WRITE_SECONDS, as leituras do navegador que acabou de gravar
+(marca na sessão do Flask, só com réplica), para que uma réplica atrasada
+não esconda a própria escrita no redirect seguinte.
+"""
+import time
+
+from flask import current_app, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Select
+
+READ_ONLY_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+READER_BIND = 'reader'
+PRIMARY = {'primary': True}  # bind_arguments for reads that must see the latest commit
+_PRIMARY_UNTIL = '_db_primary_until'
+
+
+def _is_read_only_request():
+    return has_request_context() and request.method in READ_ONLY_METHODS and \
+        flask_session.get(_PRIMARY_UNTIL, 0) <= time.time()
+
+
+class RoutingSession(Session):
+    """Sends the SELECTs of read-only requests to the reader engine, if configured"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, primary=False, **kwargs):
+        if bind is None and not primary and not self._flushing and _is_read_only_request() and \
+                (clause is None or (isinstance(clause, Select) and clause._for_update_arg is None)):
+            reader = self._db.engines.get(READER_BIND)
+            if reader is not None:
+                return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _track_writes(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _read_own_writes(session):
+    # Only a replica lags; the SQLite reader pool reads the same file
+    if session.info.pop('wrote', False) and has_request_context() and \
+            current_app.config['DATABASE_REPLICA_URL'] and READER_BIND in session._db.engines:
+        flask_session[_PRIMARY_UNTIL] = time.time() + current_app.config['DB_READ_AFTER_WRITE_SECONDS']
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_writes(session):
+    session.info.pop('wrote', None)
+
+
+def _profile_for(url, profile):
+    if profile != 'auto':
+        return profile
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'):
+        return 'sqlite-wal'
+    if url.get_backend_name() == 'postgresql':
+        return 'postgres-pooled'
+    return 'basic'
+
+
+def _sqlite_options(config):
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'connect_args': {
+            'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+            'check_same_thread': False,
+        },
+    }
+
+
+def _postgres_options(config, read_only=False):
+    options = ['-c statement_timeout=%d' % config['PG_STATEMENT_TIMEOUT_MS']]
+    if read_only:
+        options.append('-c default_transaction_read_only=on')
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': 1800,
+        'pool_pre_ping': False,
+        'pool_use_lifo': True,  # idle surplus connections age out and get recycled
+        'connect_args': {'options': ' '.join(options)},
+    }
+
+
+def _cooperative_psycopg():
+    """Under the gevent worker, let psycopg2 yield to the other greenlets while
+    it waits on the server instead of blocking the whole worker"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return
+    if monkey.is_module_patched('socket'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def configure(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS / SQLALCHEMY_BINDS from the selected
+    profile; must run before db.init_app"""
+    config = app.config
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    profile = _profile_for(url, config['DB_ENGINE_PROFILE'])
+    config['DB_ENGINE_PROFILE_ACTIVE'] = profile
+
+    if profile == 'sqlite-wal':
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = _sqlite_options(config)
+        if config['SQLITE_READ_POOL']:
+            config.setdefault('SQLALCHEMY_BINDS', {})[READER_BIND] = {
+                'url': config['SQLALCHEMY_DATABASE_URI'], **_sqlite_options(config)
+            }
+    elif profile == 'postgres-pooled':
+        _cooperative_psycopg()
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = _postgres_options(config)
+        if config['DATABASE_REPLICA_URL']:
+            config.setdefault('SQLALCHEMY_BINDS', {})[READER_BIND] = {
+                'url': config['DATABASE_REPLICA_URL'], **_postgres_options(config, read_only=True)
+            }
+    elif profile != 'basic':
+        raise ValueError(f'Perfil de engine desconhecido: {profile}')
+
+
+def init_engines(app, db):
+    """Attach the per-connection setup to the engines created by db.init_app"""
+    if app.config['DB_ENGINE_PROFILE_ACTIVE'] != 'sqlite-wal':
+        return
+    config = app.config
+
+    def set_pragmas(dbapi_connection, read_only):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=%d' % config['SQLITE_BUSY_TIMEOUT_MS'])
+        cursor.execute('PRAGMA mmap_size=%d' % config['SQLITE_MMAP_SIZE'])
+        if read_only:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+    with app.app_context():
+        writer = db.engines[None]
+        reader = db.engines.get(READER_BIND)
+
+    @event.listens_for(writer, 'connect')
+    def _connect_writer(dbapi_connection, connection_record):
+        set_pragmas(dbapi_connection, read_only=False)
+        # Let SQLAlchemy emit BEGIN itself (see _begin_writer)
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer, 'begin')
+    def _begin_writer(connection):
+        # Write requests take the write lock up front: a deferred transaction
+        # that reads and then writes fails immediately with "database is
+        # locked" if another writer committed in between, busy_timeout or not
+        if has_request_context() and request.method not in READ_ONLY_METHODS:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        else:
+            connection.exec_driver_sql('BEGIN')
+
+    if reader is not None:
+        @event.listens_for(reader, 'connect')
+        def _connect_reader(dbapi_connection, connection_record):
+            set_pragmas(dbapi_connection, read_only=True)
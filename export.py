@@ -0,0 +1,272 @@
+"""
+Exportação completa dos dados (salas, horários, horários arquivados e
+metadados de imagens) em CSV, JSON Lines e XLSX.
+
+As linhas são lidas com `yield_per` (cursor do lado do servidor no Postgres)
+e cada formato é gerado de forma incremental, em blocos de bytes, então a
+memória usada não depende do número de linhas. Colunas binárias ficam de fora
+dos arquivos de dados; com `include_blobs` elas vão como entradas separadas
+de um arquivo .zip. Colunas sensíveis (senhas dos computadores) só são
+exportadas com `include_sensitive`, disponível apenas na linha de comando.
+"""
+import csv
+import io
+import json
+import os
+import zipfile
+from datetime import date, datetime, time
+from xml.sax.saxutils import escape
+
+from sqlalchemy import LargeBinary
+from werkzeug.utils import secure_filename
+
+from app import db
+from models import File, Room, RoomImage, Schedule, ScheduleArchive
+
+YIELD_PER = 500
+BLOB_CHUNK_SIZE = 64 * 1024
+
+ENTITIES = {
+    'rooms': Room,
+    'schedules': Schedule,
+    'schedule_archive': ScheduleArchive,
+    'images': RoomImage,
+    'files': File,
+}
+
+# Left out unless include_sensitive is set
+SENSITIVE_COLUMNS = {
+    Room.__table__.c.computer_passwords,
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def _columns(model, include_sensitive=False):
+    return [
+        column for column in model.__table__.columns
+        if not isinstance(column.type, LargeBinary) and (include_sensitive or column not in SENSITIVE_COLUMNS)
+    ]
+
+
+def _iter_rows(model, include_sensitive=False):
+    columns = _columns(model, include_sensitive)
+    query = db.select(*columns).order_by(*model.__table__.primary_key.columns)
+    result = db.session.execute(query.execution_options(yield_per=YIELD_PER))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+# Writers: each yields bytes chunks
+
+def _write_csv(names, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(['' if value is None else _serialize(value) for value in row])
+        if count % YIELD_PER == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _write_jsonl(names, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, map(_serialize, row))), ensure_ascii=False))
+        if len(lines) == YIELD_PER:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class _Pipe:
+    """Write-only file object whose content is drained as the zip is built"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(reference, value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    text = escape(''.join(char for char in str(_serialize(value)) if char >= ' ' or char in '\t\n'))
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _write_xlsx(names, rows, sheet_name):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield pipe.drain()
+
+        letters = [_column_letter(index) for index in range(len(names))]
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            header = ''.join(_xlsx_cell(f'{letter}1', name) for letter, name in zip(letters, names))
+            sheet.write(f'<row r="1">{header}</row>'.encode('utf-8'))
+            for number, row in enumerate(rows, 2):
+                cells = ''.join(_xlsx_cell(f'{letter}{number}', value) for letter, value in zip(letters, row))
+                sheet.write(f'<row r="{number}">{cells}</row>'.encode('utf-8'))
+                if number % YIELD_PER == 0:
+                    yield pipe.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield pipe.drain()
+
+
+def _writer(fmt):
+    if fmt == 'csv':
+        return _write_csv
+    if fmt == 'jsonl':
+        return _write_jsonl
+    raise ExportError(f'Formato não suportado: {fmt}')
+
+
+def export_entity(entity, fmt, include_sensitive=False):
+    """Yield the export of one table as bytes chunks"""
+    if entity not in ENTITIES:
+        raise ExportError(f'Tabela desconhecida: {entity}')
+    if fmt not in FORMATS:
+        raise ExportError(f'Formato não suportado: {fmt}')
+    model = ENTITIES[entity]
+    names = [column.name for column in _columns(model, include_sensitive)]
+    rows = _iter_rows(model, include_sensitive)
+    if fmt == 'xlsx':
+        return _write_xlsx(names, rows, entity)
+    return _writer(fmt)(names, rows)
+
+
+def _iter_blobs(upload_folder):
+    """Yield (archive name, chunks) for every stored binary"""
+    query = db.select(Room.id, Room.image_data).where(Room.image_data.is_not(None)).order_by(Room.id)
+    for room_id, data in db.session.execute(query.execution_options(yield_per=20)):
+        yield f'blobs/rooms/{room_id}.bin', (data,)
+
+    query = db.select(File.id, File.filename, File.data).order_by(File.id)
+    for file_id, filename, data in db.session.execute(query.execution_options(yield_per=20)):
+        yield f'blobs/files/{file_id}_{secure_filename(filename)}', (data,)
+
+    for row in _iter_rows(RoomImage):
+        path = os.path.join(upload_folder, row.filename)
+        if os.path.exists(path):
+            yield f'blobs/uploads/{row.filename}', _read_file(path)
+
+
+def _read_file(path):
+    with open(path, 'rb') as source:
+        while True:
+            chunk = source.read(BLOB_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_archive(fmt, include_blobs=False, upload_folder=None, include_sensitive=False):
+    """Yield a .zip with one data file per table (and the blobs on request)"""
+    if fmt not in FORMATS:  # validate before anything is streamed
+        raise ExportError(f'Formato não suportado: {fmt}')
+    return _write_archive(fmt, include_blobs, upload_folder, include_sensitive)
+
+
+def _write_archive(fmt, include_blobs, upload_folder, include_sensitive):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for entity in ENTITIES:
+            with archive.open(f'{entity}.{fmt}', 'w', force_zip64=True) as entry:
+                for chunk in export_entity(entity, fmt, include_sensitive):
+                    entry.write(chunk)
+                    yield pipe.drain()
+        if include_blobs:
+            for name, chunks in _iter_blobs(upload_folder):
+                with archive.open(name, 'w', force_zip64=True) as entry:
+                    for chunk in chunks:
+                        entry.write(chunk)
+                        yield pipe.drain()
+    yield pipe.drain()
@@ -1,10 +1,25 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed, MultipleFileField
+from flask_wtf.file import FileAllowed, MultipleFileField
 from wtforms import StringField, IntegerField, BooleanField, TextAreaField, SelectField, TimeField, SubmitField, DateField
 from wtforms.validators import DataRequired, NumberRange, Length, ValidationError, Optional
 from wtforms.widgets import PasswordInput
-from models import Room, Schedule, Patrimonio
+from models import Room, Schedule
 from datetime import time, date
+import room_choices
+
+
+class RoomSelectField(SelectField):
+    """Room <select> fed by the cached room choices; the submitted id is
+    checked against the cached id set (see room_choices.room_exists) instead
+    of the rendered options"""
+
+    def __init__(self, label=None, validators=None, **kwargs):
+        kwargs.setdefault('coerce', int)
+        super(RoomSelectField, self).__init__(label, validators, **kwargs)
+
+    def pre_validate(self, form):
+        if not room_choices.room_exists(self.data):
+            raise ValidationError('Sala inválida.')
 
 
 class RoomForm(FlaskForm):
@@ -30,26 +45,8 @@ class RoomForm(FlaskForm):
             raise ValidationError('Uma sala com este nome já existe.')
 
 
-class PatrimonioForm(FlaskForm):
-    name = StringField('Nome do Patrimônio', validators=[DataRequired(), Length(max=200)])
-    description = TextAreaField('Descrição', validators=[Optional()])
-    file = FileField('Planilha do Patrimônio', validators=[
-        FileAllowed(['xls', 'xlsx', 'csv'], 'Apenas planilhas são permitidas!')
-    ])
-    submit = SubmitField('Salvar Patrimônio')
-    
-    def __init__(self, patrimonio_id=None, *args, **kwargs):
-        super(PatrimonioForm, self).__init__(*args, **kwargs)
-        self.patrimonio_id = patrimonio_id
-    
-    def validate_name(self, field):
-        patrimonio = Patrimonio.query.filter_by(name=field.data).first()
-        if patrimonio and (not self.patrimonio_id or patrimonio.id != self.patrimonio_id):
-            raise ValidationError('Já existe um patrimônio com este nome.')
-
-
 class ScheduleForm(FlaskForm):
-    room_id = SelectField('Sala', coerce=int, validators=[DataRequired()])
+    room_id = RoomSelectField('Sala', validators=[DataRequired()])
     day_of_week = SelectField('Dia da Semana', choices=[
         (0, 'Segunda-feira'),
         (1, 'Terça-feira'),
@@ -72,7 +69,7 @@ class ScheduleForm(FlaskForm):
     def __init__(self, schedule_id=None, *args, **kwargs):
         super(ScheduleForm, self).__init__(*args, **kwargs)
         self.schedule_id = schedule_id
-        self.room_id.choices = [(room.id, room.name) for room in Room.query.order_by(Room.name).all()]
+        self.room_id.choices = room_choices.form_choices(self.room_id.data)
     
     def validate_end_time(self, field):
         if self.start_time.data and field.data <= self.start_time.data:
@@ -110,7 +107,7 @@ class SearchForm(FlaskForm):
 
 
 class BulkScheduleForm(FlaskForm):
-    room_id = SelectField('Sala', coerce=int, validators=[DataRequired()])
+    room_id = RoomSelectField('Sala', validators=[DataRequired()])
     technical_course = StringField('Curso Técnico', validators=[DataRequired(), Length(min=1, max=200)])
     professor_name = StringField('Nome do Professor', validators=[DataRequired(), Length(min=1, max=100)])
     
@@ -131,7 +128,7 @@ class BulkScheduleForm(FlaskForm):
     
     def __init__(self, *args, **kwargs):
         super(BulkScheduleForm, self).__init__(*args, **kwargs)
-        self.room_id.choices = [(room.id, room.name) for room in Room.query.order_by(Room.name).all()]
+        self.room_id.choices = room_choices.form_choices(self.room_id.data)
     
     def validate_end_time(self, field):
         if self.start_time.data and field.data <= self.start_time.data:
@@ -0,0 +1,261 @@
+"""
+Instrumentação opcional da aplicação: contagem de SQL e tempo por requisição,
+histogramas de latência por rota, log de consultas lentas, tempo de renderização
+de templates/PDF/QR e um endpoint /metrics no formato Prometheus.
+
+Tudo fica desligado por padrão (METRICS_ENABLED). Desligado, nenhum hook é
+registrado e o único custo é o teste de uma flag nos decoradores `timed`.
+As métricas são mantidas por processo; com vários workers do gunicorn cada
+worker expõe os próprios números.
+"""
+import logging
+import threading
+from bisect import bisect_left
+from datetime import date, datetime, time as dt_time
+from functools import wraps
+from time import perf_counter
+
+from flask import Response, g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_enabled = False
+_hooks_installed = False
+_slow_query_seconds = 0.2
+
+
+class Histogram:
+    """Fixed-bucket histogram (counts are stored per bucket, summed on export)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Thread-safe in-process store for counters and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            names = sorted({name for name, _ in self._counters} | {name for name, _ in self._histograms})
+            for name in names:
+                kind, help_text = self._help.get(name, ('untyped', ''))
+                if help_text:
+                    lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                for (metric, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        bucket_labels = labels + (('le', _format_value(bound)),)
+                        lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+registry.describe('http_requests_total', 'counter', 'Total de requisições HTTP por rota e status.')
+registry.describe('http_request_duration_seconds', 'histogram', 'Latência das requisições HTTP por rota.')
+registry.describe('db_queries_per_request', 'histogram', 'Número de consultas SQL executadas por requisição.')
+registry.describe('db_query_duration_seconds', 'histogram', 'Duração de cada consulta SQL.')
+registry.describe('db_slow_queries_total', 'counter', 'Consultas SQL acima do limite SLOW_QUERY_MS.')
+registry.describe('template_render_duration_seconds', 'histogram', 'Tempo de renderização dos templates Jinja.')
+registry.describe('render_duration_seconds', 'histogram', 'Tempo de geração de PDF e QR code.')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _summarize_params(parameters):
+    """Describe bind parameters without leaking their values (e.g. passwords)"""
+    def describe(value):
+        if value is None or isinstance(value, (bool, int, float, date, datetime, dt_time)):
+            return repr(value)
+        if isinstance(value, (str, bytes)):
+            return f'{type(value).__name__}[{len(value)}]'
+        return type(value).__name__
+
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (dict, list, tuple)):
+        return f'{len(parameters)} rows, first: {_summarize_params(parameters[0])}'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {describe(value)}' for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(describe(value) for value in parameters) + ')'
+    return describe(parameters)
+
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+# SQLAlchemy hooks
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_metrics_start', None)
+    if start is None:
+        return
+    elapsed = perf_counter() - start
+    registry.observe('db_query_duration_seconds', (), elapsed)
+
+    if has_request_context():
+        g._metrics_sql_count = g.get('_metrics_sql_count', 0) + 1
+        g._metrics_sql_time = g.get('_metrics_sql_time', 0.0) + elapsed
+
+    if elapsed >= _slow_query_seconds:
+        registry.inc('db_slow_queries_total')
+        route = _route_label() if has_request_context() else '-'
+        logger.warning(
+            'Slow query (%.1f ms) on %s: %s | params: %s',
+            elapsed * 1000, route, ' '.join(statement.split())[:500], _summarize_params(parameters)
+        )
+
+
+# Flask hooks
+
+def _before_request():
+    g._metrics_start = perf_counter()
+    g._metrics_sql_count = 0
+    g._metrics_sql_time = 0.0
+
+
+def _after_request(response):
+    start = g.get('_metrics_start')
+    if start is None:
+        return response
+    elapsed = perf_counter() - start
+    route = _route_label()
+    sql_count = g.get('_metrics_sql_count', 0)
+    sql_time = g.get('_metrics_sql_time', 0.0)
+
+    registry.inc('http_requests_total', (('method', request.method), ('route', route), ('status', response.status_code)))
+    registry.observe('http_request_duration_seconds', (('method', request.method), ('route', route)), elapsed)
+    registry.observe('db_queries_per_request', (('route', route),), sql_count, buckets=QUERY_COUNT_BUCKETS)
+
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={sql_time * 1000:.1f};desc="{sql_count} queries", app;dur={elapsed * 1000:.1f}'
+    )
+    return response
+
+
+def _before_render_template(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('_metrics_template_starts', []).append(perf_counter())
+
+
+def _template_rendered(sender, template, context, **extra):
+    if not has_request_context():
+        return
+    starts = g.get('_metrics_template_starts')
+    if starts:
+        registry.observe('template_render_duration_seconds', (('template', template.name),), perf_counter() - starts.pop())
+
+
+def metrics_view():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def timed(kind):
+    """Decorator that records the duration of an expensive renderer (PDF, QR...)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.observe('render_duration_seconds', (('kind', kind),), perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Register the instrumentation hooks when METRICS_ENABLED is set"""
+    global _enabled, _hooks_installed, _slow_query_seconds
+
+    app.config.setdefault('METRICS_ENABLED', False)
+    app.config.setdefault('SLOW_QUERY_MS', 200)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    _enabled = True
+    _slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000.0
+
+    if not _hooks_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _hooks_installed = True
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
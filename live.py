@@ -0,0 +1,276 @@
+"""
+Atualizações ao vivo (Server-Sent Events) para os tablets nas portas das salas.
+
+Cada display abre um EventSource para uma sala (/room/<id>/events) ou para um
+andar inteiro (/location/<local>/events) e recebe a aula atual e a próxima.
+Um único Broker por processo mantém as assinaturas e uma thread leve que
+recalcula o estado das salas assistidas em uma consulta só, acordando:
+
+- no próximo início/fim de aula (limite de horário) das salas assistidas;
+- logo após o commit de qualquer alteração em Schedule.
+
+O estado só é enviado quando muda, e cada conexão ociosa custa apenas um
+dicionário com o último estado de cada sala e um heartbeat. Em produção o
+gunicorn roda com o worker gevent (.replit), em que cada conexão é uma
+greenlet e um worker mantém centenas de displays (LIVE_MAX_STREAMS). Com
+workers de threads cada conexão prende uma thread, então o limite deve ficar
+abaixo de --threads; acima dele o display recebe o estado atual e reconecta
+após LIVE_POLL_SECONDS (campo `retry` do SSE).
+
+Alterações confirmadas em outro worker ou instância não acordam este Broker:
+chegam aos displays na próxima verificação, em até MAX_SLEEP segundos.
+"""
+import json
+import logging
+import threading
+from datetime import datetime
+
+from flask import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from models import Room, Schedule
+
+logger = logging.getLogger(__name__)
+
+MAX_SLEEP = 60  # seconds; bounds the delay for writes made by other workers
+
+
+def _slot(row):
+    return {
+        'subject_name': row.subject_name,
+        'professor_name': row.professor_name,
+        'technical_course': row.technical_course,
+        'start_time': row.start_time.strftime('%H:%M'),
+        'end_time': row.end_time.strftime('%H:%M'),
+    }
+
+
+def room_status(room_ids, now=None):
+    """Current and next class of each room for today.
+
+    Returns ({room_id: status dict}, next slot boundary as a datetime or None)."""
+    now = now or datetime.now()
+    today, current_time = now.date(), now.time()
+
+    status = {
+        room_id: {'room_id': room_id, 'room_name': name, 'current': None, 'next': None}
+        for room_id, name in db.session.execute(db.select(Room.id, Room.name).where(Room.id.in_(room_ids)))
+    }
+    rows = db.session.execute(
+        db.select(
+            Schedule.room_id, Schedule.subject_name, Schedule.professor_name, Schedule.technical_course,
+            Schedule.start_time, Schedule.end_time
+        ).where(
+            Schedule.room_id.in_(room_ids),
+            Schedule.day_of_week == today.weekday(),
+            Schedule.in_window(today, today)
+        ).order_by(Schedule.start_time)
+    )
+
+    boundary = None
+    for row in rows:
+        entry = status.get(row.room_id)
+        if entry is None:
+            continue
+        if row.start_time <= current_time < row.end_time:
+            if entry['current'] is None:
+                entry['current'] = _slot(row)
+        elif row.start_time > current_time and entry['next'] is None:
+            entry['next'] = _slot(row)
+        for moment in (row.start_time, row.end_time):
+            if moment > current_time and (boundary is None or moment < boundary):
+                boundary = moment
+
+    return status, datetime.combine(today, boundary) if boundary else None
+
+
+def _encode(status):
+    return json.dumps(status, sort_keys=True, ensure_ascii=False)
+
+
+class Subscription:
+    """Latest undelivered payload per room: a floor display whose rooms all
+    change at once (e.g. at 08:00) still gets every room, and a slow display
+    only ever receives the newest state of each one"""
+
+    def __init__(self, room_ids):
+        self.room_ids = tuple(room_ids)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def push(self, room_id, payload):
+        with self._lock:
+            self._pending[room_id] = payload
+        self._ready.set()
+
+    def wait(self, timeout):
+        """Return the pending payloads, or an empty list after `timeout` seconds"""
+        if not self._ready.wait(timeout):
+            return []
+        with self._lock:
+            self._ready.clear()
+            pending, self._pending = self._pending, {}
+        return list(pending.values())
+
+
+class Broker:
+    """In-process fan-out: one state computation per change, shared by every display"""
+
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # room_id -> set of Subscription
+        self._last = {}           # room_id -> last payload sent
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._streams = 0         # open SSE responses in this process
+
+    def init_app(self, app):
+        self._app = app
+        app.config.setdefault('LIVE_HEARTBEAT_SECONDS', 15)
+        app.config.setdefault('LIVE_MAX_STREAMS', 50)
+        app.config.setdefault('LIVE_POLL_SECONDS', 60)
+
+    def _acquire_stream(self):
+        with self._lock:
+            if self._streams >= self._app.config['LIVE_MAX_STREAMS']:
+                return False
+            self._streams += 1
+            return True
+
+    def _release_stream(self):
+        with self._lock:
+            self._streams -= 1
+
+    def subscribe(self, room_ids, initial):
+        subscription = Subscription(room_ids)
+        new_rooms = False
+        with self._lock:
+            for room_id in room_ids:
+                if room_id not in self._subscriptions:
+                    self._subscriptions[room_id] = set()
+                    self._last[room_id] = initial[room_id]
+                    new_rooms = True
+                self._subscriptions[room_id].add(subscription)
+            # Started on first use so it runs in the worker, not in a preloading master
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='live-broker', daemon=True)
+                self._thread.start()
+        if new_rooms:
+            self._wakeup.set()  # the next slot boundary may now be sooner
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for room_id in subscription.room_ids:
+                subscribers = self._subscriptions.get(room_id)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[room_id]
+                    self._last.pop(room_id, None)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                timeout = self._tick()
+            except Exception:
+                logger.exception('Live broker update failed')
+                timeout = 30
+            self._wakeup.wait(timeout)
+
+    def _tick(self):
+        with self._lock:
+            room_ids = list(self._subscriptions)
+        if not room_ids:
+            return None  # sleep until someone subscribes
+
+        now = datetime.now()
+        with self._app.app_context():
+            status, boundary = room_status(room_ids, now)
+
+        with self._lock:
+            for room_id, entry in status.items():
+                payload = _encode(entry)
+                if room_id in self._subscriptions and self._last.get(room_id) != payload:
+                    self._last[room_id] = payload
+                    for subscription in self._subscriptions[room_id]:
+                        subscription.push(room_id, payload)
+
+        if boundary is None:
+            return MAX_SLEEP
+        return min(max((boundary - now).total_seconds(), 0) + 0.5, MAX_SLEEP)
+
+    def stream(self, room_ids):
+        """SSE response for the given rooms; the initial state is sent right away"""
+        status, _ = room_status(room_ids)
+        initial = {room_id: _encode(status[room_id]) for room_id in room_ids}
+        heartbeat = self._app.config['LIVE_HEARTBEAT_SECONDS']
+
+        if not self._acquire_stream():
+            # Past the limit (worker threads, memory), send the current state
+            # and let the EventSource reconnect after `retry`
+            retry = self._app.config['LIVE_POLL_SECONDS'] * 1000
+            body = f'retry: {retry}\n\n' + ''.join(
+                f'event: status\ndata: {payload}\n\n' for payload in initial.values()
+            )
+            return Response(body, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+        def generate():
+            # Subscribed inside the generator so `finally` always unsubscribes
+            subscription = self.subscribe(room_ids, initial)
+            try:
+                yield 'retry: 5000\n\n'
+                for payload in initial.values():
+                    yield f'event: status\ndata: {payload}\n\n'
+                while True:
+                    payloads = subscription.wait(heartbeat)
+                    if not payloads:
+                        yield ': keepalive\n\n'
+                        continue
+                    yield ''.join(f'event: status\ndata: {payload}\n\n' for payload in payloads)
+            finally:
+                self.unsubscribe(subscription)
+
+        # The generator doesn't use the request context, so the database
+        # connection is released as soon as the view returns
+        response = Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+        # Called by the server when the response is closed, even if the
+        # generator never started
+        response.call_on_close(self._release_stream)
+        return response
+
+
+broker = Broker()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_schedule_writes(session, flush_context):
+    if session.info.get('live_dirty'):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Schedule):
+            session.info['live_dirty'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_after_commit(session):
+    if session.info.pop('live_dirty', False):
+        broker.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('live_dirty', None)
@@ -1,9 +1,7 @@
-from app import app, db
-import models  # importa os modelos para que o SQLAlchemy os conheça
+from app import create_app
 
-# Garante que as tabelas existem no Postgres (só cria se não existirem)
-with app.app_context():
-    db.create_all()
+# O esquema do banco não é mais criado na importação; use `flask --app main init-db`
+app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000, debug=app.config['DEBUG'])
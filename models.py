@@ -1,6 +1,6 @@
 from app import db
 from datetime import datetime, time
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, and_, or_
 
 class Room(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -58,6 +58,9 @@ class Schedule(db.Model):
     __table_args__ = (
         CheckConstraint('start_time < end_time', name='check_time_order'),
         CheckConstraint('day_of_week >= 0 AND day_of_week <= 6', name='check_day_of_week'),
+        # Date-window lookups per room and the archival scan by end_date
+        db.Index('ix_schedule_room_window', 'room_id', 'end_date', 'start_date'),
+        db.Index('ix_schedule_end_date', 'end_date'),
     )
     
     def __repr__(self):
@@ -68,6 +71,44 @@ class Schedule(db.Model):
         days = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 
                 'Sexta-feira', 'Sábado', 'Domingo']
         return days[self.day_of_week]
+    
+    @classmethod
+    def in_window(cls, start, end):
+        """Filter for schedules whose period overlaps [start, end] (no date = open-ended)"""
+        return and_(
+            or_(cls.end_date.is_(None), cls.end_date >= start),
+            or_(cls.start_date.is_(None), cls.start_date <= end)
+        )
+
+
+class ScheduleArchive(db.Model):
+    """
+    Horários cujo período já terminou, movidos para fora da tabela principal
+    pelo comando `flask archive-schedules`. Sem chave estrangeira para que o
+    histórico sobreviva à exclusão da sala.
+    """
+    __tablename__ = 'schedule_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Not unique: SQLite may hand the id of an archived row to a new schedule
+    schedule_id = db.Column(db.Integer, nullable=False, index=True)
+    room_id = db.Column(db.Integer, nullable=False, index=True)
+    day_of_week = db.Column(db.Integer, nullable=False)
+    subject_name = db.Column(db.String(100), nullable=False)
+    professor_name = db.Column(db.String(100), nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    start_date = db.Column(db.Date)
+    end_date = db.Column(db.Date)
+    technical_course = db.Column(db.String(200))
+    is_recurring = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    day_name = Schedule.day_name
+    
+    def __repr__(self):
+        return f'<ScheduleArchive {self.subject_name} - {self.professor_name}>'
 
 
 class File(db.Model):
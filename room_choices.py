@@ -0,0 +1,137 @@
+"""
+Cache das opções de sala (id, nome) usadas nos formulários de horário e na
+busca por prefixo (typeahead).
+
+Apenas as colunas id e name são lidas do banco. O cache é invalidado ao
+confirmar (commit) qualquer inclusão, exclusão ou renomeação de sala nesta
+instância; o TTL cobre alterações feitas por outros workers, e um id ausente
+do cache é confirmado no banco antes de ser rejeitado (room_exists).
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from database import PRIMARY
+from models import Room
+
+CACHE_TTL = 300  # seconds
+INLINE_CHOICES_LIMIT = 200  # above this, forms lazy-load options via typeahead
+
+_lock = threading.Lock()
+_cache = None
+
+
+class _RoomChoices:
+    def __init__(self, rows):
+        self.loaded_at = time.monotonic()
+        self.choices = [(room_id, name) for room_id, name in rows]
+        self.ids = frozenset(room_id for room_id, _ in self.choices)
+        self.names = dict(self.choices)
+        index = sorted((name.casefold(), room_id) for room_id, name in self.choices)
+        self.keys = [key for key, _ in index]
+        self.index = index
+
+
+def _get():
+    global _cache
+    cache = _cache
+    if cache is not None and time.monotonic() - cache.loaded_at < CACHE_TTL:
+        return cache
+    with _lock:
+        cache = _cache
+        if cache is None or time.monotonic() - cache.loaded_at >= CACHE_TTL:
+            # Loaded from the primary: a lagging replica would be cached for CACHE_TTL
+            rows = db.session.execute(
+                db.select(Room.id, Room.name).order_by(Room.name), bind_arguments=PRIMARY
+            ).all()
+            cache = _cache = _RoomChoices(rows)
+    return cache
+
+
+def invalidate():
+    global _cache
+    _cache = None
+
+
+def get_room_choices():
+    """Return the (id, name) list ordered by name"""
+    return _get().choices
+
+
+def get_room_ids():
+    return _get().ids
+
+
+def room_exists(room_id):
+    """Check a submitted room id; a miss is confirmed in the database since
+    the room may have been created by another worker after the cache load"""
+    if room_id in _get().ids:
+        return True
+    # Only the id: the Room row carries the image_data blob
+    if room_id is not None and db.session.execute(
+        db.select(Room.id).where(Room.id == room_id), bind_arguments=PRIMARY
+    ).first() is not None:
+        invalidate()
+        return True
+    return False
+
+
+def form_choices(selected_id=None):
+    """Choices for a room <select>: all rooms, or only the selected one when
+    there are too many rooms and the options are lazy-loaded by the browser"""
+    cache = _get()
+    if len(cache.choices) <= INLINE_CHOICES_LIMIT:
+        return cache.choices
+    if selected_id in cache.ids:
+        return [(selected_id, cache.names[selected_id])]
+    return []
+
+
+def search_rooms(prefix, limit=20):
+    """Case-insensitive prefix search over the cached room names"""
+    cache = _get()
+    prefix = (prefix or '').strip().casefold()
+    if not prefix:
+        return cache.choices[:limit]
+    results = []
+    position = bisect_left(cache.keys, prefix)
+    while position < len(cache.keys) and len(results) < limit:
+        key, room_id = cache.index[position]
+        if not key.startswith(prefix):
+            break
+        results.append((room_id, cache.names[room_id]))
+        position += 1
+    return results
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_room_writes(session, flush_context):
+    if session.info.get('room_choices_dirty'):
+        return
+    for obj in session.new:
+        if isinstance(obj, Room):
+            session.info['room_choices_dirty'] = True
+            return
+    for obj in session.deleted:
+        if isinstance(obj, Room):
+            session.info['room_choices_dirty'] = True
+            return
+    for obj in session.dirty:
+        if isinstance(obj, Room) and inspect(obj).attrs.name.history.has_changes():
+            session.info['room_choices_dirty'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('room_choices_dirty', False):
+        invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('room_choices_dirty', None)
@@ -1,16 +1,21 @@
-import io
+import os
 import json
-import uuid
 from datetime import datetime, timedelta
-from flask import render_template, request, redirect, url_for, flash, send_file, abort
-from werkzeug.utils import secure_filename
-from app import app, db
+from flask import Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, send_file, send_from_directory, abort, jsonify, stream_with_context
+from app import db
 from models import Room, RoomImage, Schedule
 from forms import RoomForm, ScheduleForm, SearchForm, BulkScheduleForm
-from utils import generate_room_pdf, generate_room_qr_code, allowed_file
+from utils import generate_room_pdf, generate_room_qr_code, allowed_file, room_schedules, archived_schedules
+from room_choices import search_rooms
+from uploads import MIMETYPES, process_uploads, remove_files
+import allocation
+import export
+import live
 from sqlalchemy import or_
 
-@app.route('/')
+bp = Blueprint('main', __name__)
+
+@bp.route('/')
 def index():
     search_form = SearchForm()
     rooms = Room.query.all()
@@ -57,10 +62,12 @@ def index():
     
     return render_template('index.html', rooms=rooms, search_form=search_form)
 
-@app.route('/room/<int:room_id>')
+@bp.route('/room/<int:room_id>')
 def room_detail(room_id):
     room = Room.query.get_or_404(room_id)
-    schedules = Schedule.query.filter_by(room_id=room_id).order_by(Schedule.day_of_week, Schedule.start_time).all()
+    history = request.args.get('history') == '1'
+    schedules = room_schedules(room_id, history=history)
+    archived = archived_schedules(room_id) if history else []
     
     # Parse software list
     software_list = []
@@ -70,9 +77,64 @@ def room_detail(room_id):
         except:
             software_list = room.software_list.split('\n') if room.software_list else []
     
-    return render_template('room_detail.html', room=room, schedules=schedules, software_list=software_list)
+    return render_template('room_detail.html', room=room, schedules=schedules, software_list=software_list,
+                           history=history, archived_schedules=archived)
+
+def _process_images(files):
+    """Spool, validate and store the uploaded images; rejected files are flashed.
+
+    Call it before changing any object in the session: the open (read)
+    transaction is ended first, since on SQLite a write request holds the
+    write lock from its first query (see database.py) and processing the
+    uploads must not block the other writers"""
+    files = [file for file in files or [] if file and file.filename and allowed_file(file.filename)]
+    if files:
+        db.session.rollback()
+    processed, errors = process_uploads(
+        files,
+        current_app.config['UPLOAD_FOLDER'],
+        max_workers=current_app.config['UPLOAD_WORKERS'],
+        max_pixels=current_app.config['MAX_IMAGE_PIXELS']
+    )
+    for error in errors:
+        flash(error, 'warning')
+    return processed
+
+def _attach_images(room, processed):
+    # Skip content the room already has (same hash => same filename)
+    existing = {image.filename for image in room.images}
+    for image in processed:
+        if image.filename not in existing:
+            room.images.append(RoomImage(filename=image.filename, original_filename=image.original_filename))
+            existing.add(image.filename)
+
+def _commit_with_images(room, processed):
+    """Attach the processed images to the room and commit; on failure the
+    files this request created are removed (unless another row uses them)"""
+    try:
+        _attach_images(room, processed)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        _discard_images(processed)
+        raise
 
-@app.route('/room/new', methods=['GET', 'POST'])
+def _discard_images(processed):
+    _remove_unreferenced(image.filename for image in processed if image.created)
+
+def _remove_unreferenced(filenames):
+    """Delete stored image files that no RoomImage row references any more"""
+    filenames = set(filenames)
+    if not filenames:
+        return
+    try:
+        in_use = set(db.session.scalars(db.select(RoomImage.filename).where(RoomImage.filename.in_(filenames))))
+    except Exception:
+        db.session.rollback()
+        return  # can't tell which files are referenced: keep them all
+    remove_files(filenames, current_app.config['UPLOAD_FOLDER'], in_use)
+
+@bp.route('/room/new', methods=['GET', 'POST'])
 def room_new():
     form = RoomForm()
     
@@ -91,27 +153,16 @@ def room_new():
             software_list = [s.strip() for s in form.software_list.data.split('\n') if s.strip()]
             room.software_list = json.dumps(software_list)
         
+        # Handle image uploads (processed before anything is written to the database)
+        processed = _process_images(form.images.data)
         db.session.add(room)
-        db.session.flush()  # pega o room.id antes do commit
-        
-        # Handle image uploads
-        if form.images.data:
-            for file in form.images.data:
-                if file and file.filename and allowed_file(file.filename):
-                    room_image = RoomImage(
-                        data=file.read(),  # salva os bytes no banco
-                        original_filename=secure_filename(file.filename),
-                        room_id=room.id
-                    )
-                    db.session.add(room_image)
-        
-        db.session.commit()
+        _commit_with_images(room, processed)
         flash('Sala criada com sucesso!', 'success')
-        return redirect(url_for('room_detail', room_id=room.id))
+        return redirect(url_for('main.room_detail', room_id=room.id))
     
     return render_template('room_form.html', form=form, title='Nova Sala')
 
-@app.route('/room/<int:room_id>/edit', methods=['GET', 'POST'])
+@bp.route('/room/<int:room_id>/edit', methods=['GET', 'POST'])
 def room_edit(room_id):
     room = Room.query.get_or_404(room_id)
     form = RoomForm(room_id=room_id, obj=room)
@@ -125,6 +176,9 @@ def room_edit(room_id):
             form.software_list.data = room.software_list
     
     if form.validate_on_submit():
+        # Handle new image uploads (before the room is changed, see _process_images)
+        processed = _process_images(form.images.data)
+        
         room.name = form.name.data
         room.location = form.location.data
         room.capacity = form.capacity.data
@@ -139,58 +193,60 @@ def room_edit(room_id):
         else:
             room.software_list = None
         
-        # Handle new image uploads
-        if form.images.data:
-            for file in form.images.data:
-                if file and file.filename and allowed_file(file.filename):
-                    room_image = RoomImage(
-                        data=file.read(),
-                        original_filename=secure_filename(file.filename),
-                        room_id=room.id
-                    )
-                    db.session.add(room_image)
-        
-        db.session.commit()
+        _commit_with_images(room, processed)
         flash('Sala atualizada com sucesso!', 'success')
-        return redirect(url_for('room_detail', room_id=room.id))
+        return redirect(url_for('main.room_detail', room_id=room.id))
     
     return render_template('room_form.html', form=form, title='Editar Sala', room=room)
 
-@app.route('/room/<int:room_id>/delete', methods=['POST'])
+@bp.route('/room/<int:room_id>/delete', methods=['POST'])
 def room_delete(room_id):
     room = Room.query.get_or_404(room_id)
+    filenames = [image.filename for image in room.images]
     
     db.session.delete(room)
     db.session.commit()
+    _remove_unreferenced(filenames)
     flash('Sala excluída com sucesso!', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/room/<int:room_id>/image/<int:image_id>/delete', methods=['POST'])
+@bp.route('/room/<int:room_id>/image/<int:image_id>/delete', methods=['POST'])
 def image_delete(room_id, image_id):
     room = Room.query.get_or_404(room_id)
     image = RoomImage.query.filter_by(id=image_id, room_id=room_id).first_or_404()
     
     db.session.delete(image)
     db.session.commit()
+    _remove_unreferenced([image.filename])
     flash('Imagem excluída com sucesso!', 'success')
-    return redirect(url_for('room_detail', room_id=room_id))
+    return redirect(url_for('main.room_detail', room_id=room_id))
 
-@app.route('/room/image/<int:image_id>')
+@bp.route('/room/image/<int:image_id>')
 def get_room_image(image_id):
     image = RoomImage.query.get_or_404(image_id)
-    return send_file(
-        io.BytesIO(image.data),
-        mimetype="image/jpeg",  # pode detectar pelo nome original
+    extension = image.filename.rsplit('.', 1)[-1].lower()
+    # Stored files are named after their content hash, so they never change
+    return send_from_directory(
+        os.path.abspath(current_app.config['UPLOAD_FOLDER']),
+        image.filename,
+        mimetype=MIMETYPES.get(extension, 'application/octet-stream'),
         as_attachment=False,
-        download_name=image.original_filename
+        download_name=image.original_filename,
+        max_age=31536000
     )
 
-@app.route('/schedule/new')
+@bp.route('/api/rooms/search')
+def room_search():
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    rooms = search_rooms(request.args.get('q', ''), limit=limit)
+    return jsonify([{'id': room_id, 'name': name} for room_id, name in rooms])
+
+@bp.route('/schedule/new')
 def schedule_new():
-    form = ScheduleForm()
+    form = ScheduleForm(room_id=request.args.get('room_id', type=int))
     return render_template('schedule_form.html', form=form, title='Novo Horário')
 
-@app.route('/schedule/new', methods=['POST'])
+@bp.route('/schedule/new', methods=['POST'])
 def schedule_create():
     form = ScheduleForm()
     
@@ -211,11 +267,11 @@ def schedule_create():
         db.session.add(schedule)
         db.session.commit()
         flash('Horário criado com sucesso!', 'success')
-        return redirect(url_for('room_detail', room_id=schedule.room_id))
+        return redirect(url_for('main.room_detail', room_id=schedule.room_id))
     
     return render_template('schedule_form.html', form=form, title='Novo Horário')
 
-@app.route('/schedule/<int:schedule_id>/edit', methods=['GET', 'POST'])
+@bp.route('/schedule/<int:schedule_id>/edit', methods=['GET', 'POST'])
 def schedule_edit(schedule_id):
     schedule = Schedule.query.get_or_404(schedule_id)
     form = ScheduleForm(schedule_id=schedule_id, obj=schedule)
@@ -234,11 +290,11 @@ def schedule_edit(schedule_id):
         
         db.session.commit()
         flash('Horário atualizado com sucesso!', 'success')
-        return redirect(url_for('room_detail', room_id=schedule.room_id))
+        return redirect(url_for('main.room_detail', room_id=schedule.room_id))
     
     return render_template('schedule_form.html', form=form, title='Editar Horário', schedule=schedule)
 
-@app.route('/schedule/<int:schedule_id>/delete', methods=['POST'])
+@bp.route('/schedule/<int:schedule_id>/delete', methods=['POST'])
 def schedule_delete(schedule_id):
     schedule = Schedule.query.get_or_404(schedule_id)
     room_id = schedule.room_id
@@ -246,26 +302,26 @@ def schedule_delete(schedule_id):
     db.session.delete(schedule)
     db.session.commit()
     flash('Horário excluído com sucesso!', 'success')
-    return redirect(url_for('room_detail', room_id=room_id))
+    return redirect(url_for('main.room_detail', room_id=room_id))
 
-@app.route('/room/<int:room_id>/pdf')
+@bp.route('/room/<int:room_id>/pdf')
 def room_pdf(room_id):
     room = Room.query.get_or_404(room_id)
     pdf_path = generate_room_pdf(room)
     
     return send_file(pdf_path, as_attachment=True, download_name=f'sala_{room.name}.pdf')
 
-@app.route('/room/<int:room_id>/qrcode')
+@bp.route('/room/<int:room_id>/qrcode')
 def room_qr_code(room_id):
     room = Room.query.get_or_404(room_id)
     qr_path = generate_room_qr_code(room)
     
     return send_file(qr_path, as_attachment=True, download_name=f'qrcode_sala_{room.name}.png', mimetype='image/png')
 
-@app.route('/room/<int:room_id>/standalone')
+@bp.route('/room/<int:room_id>/standalone')
 def room_standalone(room_id):
     room = Room.query.get_or_404(room_id)
-    schedules = Schedule.query.filter_by(room_id=room_id).order_by(Schedule.day_of_week, Schedule.start_time).all()
+    schedules = room_schedules(room_id)
     
     # Parse software list
     software_list = []
@@ -275,17 +331,36 @@ def room_standalone(room_id):
         except:
             software_list = room.software_list.split('\n') if room.software_list else []
     
+    now = datetime.now()
+    status, _ = live.room_status([room.id], now)
+    
     return render_template('room_standalone.html', 
                          room=room, 
                          schedules=schedules, 
                          software_list=software_list,
-                         now=datetime.now())
+                         status=status[room.id],
+                         now=now)
+
+@bp.route('/room/<int:room_id>/events')
+def room_events(room_id):
+    if db.session.get(Room, room_id) is None:
+        abort(404)
+    return live.broker.stream([room_id])
 
-@app.errorhandler(404)
+@bp.route('/location/<path:location>/events')
+def location_events(location):
+    room_ids = db.session.execute(
+        db.select(Room.id).where(Room.location == location).order_by(Room.name)
+    ).scalars().all()
+    if not room_ids:
+        abort(404)
+    return live.broker.stream(room_ids)
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('base.html'), 404
 
-@app.route('/schedule/bulk', methods=['GET', 'POST'])
+@bp.route('/schedule/bulk', methods=['GET', 'POST'])
 def schedule_bulk():
     form = BulkScheduleForm()
     
@@ -338,14 +413,65 @@ def schedule_bulk():
             db.session.commit()
             flash(f'{schedules_created} agendamentos criados com sucesso!', 'success')
             room = Room.query.get(form.room_id.data)
-            return redirect(url_for('room_detail', room_id=room.id))
+            return redirect(url_for('main.room_detail', room_id=room.id))
         else:
             flash('Nenhum agendamento foi criado. Verifique se há conflitos de horário.', 'warning')
     
     return render_template('bulk_schedule_form.html', form=form, title='Agendamento em Lote')
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('base.html'), 500
 
+
+@bp.route('/api/allocation/preview', methods=['POST'])
+def allocation_preview():
+    payload = request.get_json(silent=True) or {}
+    try:
+        plan = allocation.solve(allocation.parse_demands(payload.get('demands')))
+    except allocation.AllocationError as error:
+        return jsonify({'error': str(error)}), 400
+    return jsonify(plan.to_dict())
+
+@bp.route('/api/allocation/commit', methods=['POST'])
+def allocation_commit():
+    payload = request.get_json(silent=True) or {}
+    try:
+        demands = allocation.parse_demands(payload.get('demands'))
+    except allocation.AllocationError as error:
+        return jsonify({'error': str(error)}), 400
+    # The previewed assignment must still hold; otherwise nothing is written
+    room_ids = {str(key): room_id for key, room_id in (payload.get('assignments') or {}).items()}
+    try:
+        plan = allocation.check(demands, room_ids)
+    except allocation.AllocationError as error:
+        return jsonify({'error': str(error)}), 409
+    created = allocation.commit(plan)
+    return jsonify({'created': created, **plan.to_dict()}), 201
+
+@bp.route('/export/<entity>.<fmt>')
+def export_data(entity, fmt):
+    try:
+        chunks = export.export_entity(entity, fmt)
+    except export.ExportError:
+        abort(404)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={entity}.{fmt}'}
+    )
+
+@bp.route('/export/archive.zip')
+def export_archive():
+    fmt = request.args.get('format', 'csv')
+    include_blobs = request.args.get('blobs') == '1'
+    try:
+        chunks = export.export_archive(fmt, include_blobs, current_app.config['UPLOAD_FOLDER'])
+    except export.ExportError:
+        abort(404)
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=mapa_de_salas.zip'}
+    )
@@ -130,6 +130,60 @@ document.addEventListener('DOMContentLoaded', function() {
         if (endTimeInput) endTimeInput.addEventListener('change', checkScheduleConflict);
     }
 
+    // Room typeahead: filters/lazy-loads the room options from the JSON endpoint
+    const typeaheadSelects = document.querySelectorAll('select[data-typeahead-url]');
+    typeaheadSelects.forEach(function(select) {
+        const searchInput = document.createElement('input');
+        searchInput.type = 'search';
+        searchInput.className = 'form-control form-control-sm mb-1';
+        searchInput.placeholder = 'Buscar sala pelo nome...';
+        select.parentNode.insertBefore(searchInput, select);
+
+        // Options rendered inline (all rooms) are restored when the search is cleared
+        const inlineOptions = select.options.length > 1 ?
+            Array.prototype.map.call(select.options, function(option) { return option.cloneNode(true); }) : null;
+
+        let typeaheadTimeout;
+        let typeaheadRequest = 0;
+        function loadRooms() {
+            const request = ++typeaheadRequest;
+            if (inlineOptions && !searchInput.value.trim()) {
+                const selected = select.value;
+                select.innerHTML = '';
+                inlineOptions.forEach(function(option) { select.appendChild(option.cloneNode(true)); });
+                if (selected) select.value = selected;
+                return;
+            }
+            const url = select.getAttribute('data-typeahead-url') + '?q=' + encodeURIComponent(searchInput.value);
+            fetch(url)
+                .then(function(response) { return response.json(); })
+                .then(function(rooms) {
+                    if (request !== typeaheadRequest) return;  // a newer search is pending
+                    const selected = select.value;
+                    const selectedOption = select.querySelector('option[value="' + selected + '"]');
+                    select.innerHTML = '';
+                    if (selectedOption && !rooms.some(function(room) { return String(room.id) === selected; })) {
+                        select.appendChild(selectedOption);
+                    }
+                    rooms.forEach(function(room) {
+                        const option = document.createElement('option');
+                        option.value = room.id;
+                        option.textContent = room.name;
+                        select.appendChild(option);
+                    });
+                    if (selected) select.value = selected;
+                });
+        }
+
+        searchInput.addEventListener('input', function() {
+            clearTimeout(typeaheadTimeout);
+            typeaheadTimeout = setTimeout(loadRooms, 250);
+        });
+
+        // Nothing was rendered inline (too many rooms): load the first page
+        if (select.options.length <= 1) loadRooms();
+    });
+
     // Smooth scrolling for anchor links
     const anchorLinks = document.querySelectorAll('a[href^="#"]');
     anchorLinks.forEach(function(link) {
@@ -0,0 +1,166 @@
+"""
+Pipeline de upload de imagens de sala.
+
+Cada arquivo é copiado em blocos para um arquivo temporário na pasta de
+uploads enquanto o SHA-256 é calculado; depois o tipo real e as dimensões são
+conferidos pelo cabeçalho da imagem (sem decodificar os pixels). O arquivo
+final é salvo como `<sha256>.<ext>`, então o mesmo conteúdo enviado duas vezes
+ocupa um único arquivo. Vários arquivos são processados em paralelo em um pool
+de threads compartilhado, e a memória usada por arquivo fica limitada ao
+tamanho do bloco.
+"""
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Formato detectado pelo Pillow -> extensão salva
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+MIMETYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    pass
+
+
+class ProcessedImage:
+    def __init__(self, filename, original_filename, width, height, created):
+        self.filename = filename
+        self.original_filename = original_filename
+        self.width = width
+        self.height = height
+        self.created = created  # False when the content was already stored
+
+    def __repr__(self):
+        return f'<ProcessedImage {self.filename}>'
+
+
+def _get_executor(max_workers):
+    # Created lazily so the pool's threads are started after a pre-fork server
+    # has forked its workers
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+    return _executor
+
+
+def _spool(file_storage, upload_folder):
+    """Copy the upload to a temporary file in chunks, hashing it on the way"""
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            stream = file_storage.stream
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                output.write(chunk)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    return temp_path, digest.hexdigest()
+
+
+def _inspect_image(path, original_filename, max_pixels):
+    """Check the real image type and dimensions from the header only"""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        # Only the accepted decoders are tried on the untrusted file
+        with Image.open(path, formats=tuple(IMAGE_FORMATS)) as image:
+            if image.format not in IMAGE_FORMATS:
+                raise UploadError(f'{original_filename}: formato de imagem não suportado.')
+            width, height = image.size
+            if width * height > max_pixels:
+                raise UploadError(f'{original_filename}: imagem muito grande ({width}x{height}).')
+            image.verify()
+            return IMAGE_FORMATS[image.format], width, height
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError, struct.error):
+        raise UploadError(f'{original_filename}: arquivo não é uma imagem válida.')
+
+
+def process_upload(file_storage, upload_folder, max_pixels):
+    """Spool, validate and store one uploaded image; returns a ProcessedImage"""
+    original_filename = secure_filename(file_storage.filename) or 'imagem'
+    temp_path, digest = _spool(file_storage, upload_folder)
+    try:
+        extension, width, height = _inspect_image(temp_path, original_filename, max_pixels)
+        filename = f'{digest}.{extension}'
+        final_path = os.path.join(upload_folder, filename)
+        if os.path.exists(final_path):
+            os.unlink(temp_path)
+            created = False
+        else:
+            os.replace(temp_path, final_path)
+            created = True
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return ProcessedImage(filename, original_filename, width, height, created)
+
+
+def process_uploads(files, upload_folder, max_workers=4, max_pixels=40_000_000):
+    """
+    Process several uploads concurrently. Returns (processed, errors): the
+    images that were stored and the user-facing messages for rejected files.
+    """
+    files = [file for file in files if file and file.filename]
+    if not files:
+        return [], []
+
+    executor = _get_executor(max_workers)
+    futures = [executor.submit(process_upload, file, upload_folder, max_pixels) for file in files]
+
+    processed, errors = [], []
+    try:
+        for file, future in zip(files, futures):
+            try:
+                processed.append(future.result())
+            except UploadError as error:
+                errors.append(str(error))
+            except Exception:
+                # Disk full, truncated headers Pillow chokes on, ...: reject only this file
+                logger.exception('Failed to process upload %r', file.filename)
+                errors.append(f'{secure_filename(file.filename) or "imagem"}: não foi possível processar o arquivo.')
+    except BaseException:
+        # Interrupted while collecting: don't leave the files of this batch behind
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        discard([future.result() for future in futures
+                 if not future.cancelled() and future.exception() is None], upload_folder)
+        raise
+    return processed, errors
+
+
+def discard(processed, upload_folder, in_use=()):
+    """Remove the files written by process_uploads (used when the commit fails)"""
+    remove_files([image.filename for image in processed if image.created], upload_folder, in_use)
+
+
+def remove_files(filenames, upload_folder, in_use=()):
+    """Unlink stored files, keeping the ones named in `in_use`: with
+    content-addressed names, one file may back several RoomImage rows"""
+    for filename in set(filenames) - set(in_use):
+        try:
+            os.unlink(os.path.join(upload_folder, filename))
+        except OSError:
+            pass
@@ -1,16 +1,13 @@
 import os
 import json
 import tempfile
-import qrcode
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from PIL import Image as PILImage
-from models import Schedule
-from app import app
-from flask import url_for, request
+from datetime import date, timedelta
+from models import Schedule, ScheduleArchive
+from flask import current_app, url_for, request
+from instrumentation import timed
+
+# ReportLab, qrcode and Pillow are imported on first use: most requests (and
+# workers) never render a PDF or QR code, so they shouldn't pay for the import.
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
@@ -18,8 +15,31 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def room_schedules(room_id, history=False):
+    """Schedules of a room in the active date window (today .. today + SCHEDULE_WINDOW_DAYS),
+    or every row still in the schedule table when history=True"""
+    query = Schedule.query.filter_by(room_id=room_id)
+    if not history:
+        today = date.today()
+        window_end = today + timedelta(days=current_app.config['SCHEDULE_WINDOW_DAYS'])
+        query = query.filter(Schedule.in_window(today, window_end))
+    return query.order_by(Schedule.day_of_week, Schedule.start_time).all()
+
+def archived_schedules(room_id):
+    return ScheduleArchive.query.filter_by(room_id=room_id).order_by(
+        ScheduleArchive.end_date.desc(), ScheduleArchive.day_of_week, ScheduleArchive.start_time
+    ).all()
+
+@timed('pdf')
 def generate_room_pdf(room):
     """Generate a comprehensive PDF report for a room"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib import colors
+    from PIL import Image as PILImage
+
     # Create temporary file
     temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
     os.close(temp_fd)
@@ -90,7 +110,7 @@ def generate_room_pdf(room):
         story.append(Spacer(1, 20))
     
     # Schedule information
-    schedules = Schedule.query.filter_by(room_id=room.id).order_by(Schedule.day_of_week, Schedule.start_time).all()
+    schedules = room_schedules(room.id)
     if schedules:
         story.append(Paragraph("Agenda de Uso", styles['Heading2']))
         
@@ -150,7 +170,7 @@ def generate_room_pdf(room):
         story.append(Paragraph("Imagens da Sala", styles['Heading2']))
         
         for image in room.images:
-            image_path = os.path.join(app.config['UPLOAD_FOLDER'], image.filename)
+            image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image.filename)
             if os.path.exists(image_path):
                 try:
                     # Open and resize image if necessary
@@ -186,10 +206,13 @@ def generate_room_pdf(room):
     
     return temp_path
 
+@timed('qrcode')
 def generate_room_qr_code(room):
     """Generate a QR code for a room with its standalone information page"""
+    import qrcode
+
     # Create the URL for standalone room information
-    room_url = url_for('room_standalone', room_id=room.id, _external=True)
+    room_url = url_for('main.room_standalone', room_id=room.id, _external=True)
     
     # Create QR code
     qr = qrcode.QRCode(